@@ -14,17 +14,27 @@ Metrics calculated:
   - Composite: Magic Formula rank, Piotroski F-Score (0-9), Buy/Hold/Sell signal
 """
 
+import csv
+import io
 import os
 import sys
 import time
 import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import date
 
 import yfinance as yf
 import pandas as pd
 import numpy as np
+from psycopg2.extras import execute_values
 from sqlalchemy import create_engine, text
 
+try:
+    import requests_cache
+except ImportError:  # optional - re-runs just hit the network again
+    requests_cache = None
+
 logging.basicConfig(
     level=logging.INFO,
     format="%(asctime)s [%(levelname)s] %(message)s",
@@ -42,6 +52,9 @@ DB_USER = os.environ.get("DB_USER", "postgres")
 DB_PASS = os.environ.get("DB_PASS", "postgres")
 TICKERS_FILE = os.environ.get("TICKERS_FILE", "/config/tickers.txt")
 DELAY = float(os.environ.get("DELAY_SECONDS", "1.5"))
+FETCH_THREADS = int(os.environ.get("FETCH_THREADS", "8"))
+YF_CACHE = os.environ.get("YF_CACHE", "/tmp/yfcache")
+YF_CACHE_TTL = int(os.environ.get("YF_CACHE_TTL", "3600"))
 
 DATABASE_URL = f"postgresql://{DB_USER}:{DB_PASS}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
 
@@ -98,29 +111,81 @@ CREATE TABLE IF NOT EXISTS stock_metrics (
 def get_tickers():
     """Read ticker list from mounted config file."""
     with open(TICKERS_FILE) as f:
-        return [line.strip() for line in f if line.strip() and not line.startswith("#")]
+        lines = [line.strip() for line in f.read().splitlines()]
+    return [t for t in lines if t and not t.startswith("#")]
+
+
+class RateLimiter:
+    """Token-bucket style limiter shared by fetch workers.
+
+    Enforces one request per `interval` seconds globally, so total QPS
+    against yfinance stays at the old 1/DELAY rate no matter how many
+    worker threads are fetching.
+    """
+
+    def __init__(self, interval):
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._next_at = 0.0
+
+    def wait(self):
+        with self._lock:
+            now = time.monotonic()
+            sleep_for = self._next_at - now
+            self._next_at = max(now, self._next_at) + self.interval
+        if sleep_for > 0:
+            time.sleep(sleep_for)
 
 
 def create_tables(engine):
     """Create tables if they don't exist."""
     with engine.begin() as conn:
-        for stmt in SCHEMA_SQL.split(";"):
-            stmt = stmt.strip()
-            if stmt:
-                conn.execute(text(stmt))
+        # psycopg2 takes the whole multi-statement DDL in one round-trip
+        conn.exec_driver_sql(SCHEMA_SQL)
     log.info("Database tables ready")
 
 
 def safe(val):
-    """Return None for NaN/Inf values, pass through everything else."""
+    """Return None for None/NaN/Inf/non-numeric values, else float(val).
+
+    Scalar fast path: `f != f` is the canonical NaN test and skips the
+    generic pd.isna dispatch, which this hot helper was paying ~20 times
+    per ticker.
+    """
     if val is None:
         return None
-    try:
-        if pd.isna(val) or np.isinf(val):
+    if isinstance(val, (int, float)):
+        f = float(val)
+        if f != f or f == float("inf") or f == float("-inf"):
             return None
-    except (TypeError, ValueError):
-        pass
-    return float(val)
+        return f
+    return None
+
+
+def stmt_lookup(df):
+    """Materialize a statement DataFrame as (ndarray, {label: row index}).
+
+    One conversion per statement replaces every subsequent df.loc[key]
+    Series allocation with a dict hit and a C-level array read.
+    Returns None for a missing/empty statement.
+    """
+    if df is None or df.empty:
+        return None
+    return df.to_numpy(), {lbl: i for i, lbl in enumerate(df.index)}
+
+
+def lookup_value(lookup, keys, col=0):
+    """get_stmt_value against a stmt_lookup() tuple; NaN when missing."""
+    if lookup is None:
+        return np.nan
+    vals, idx = lookup
+    for key in keys:
+        row = idx.get(key)
+        if row is not None and col < vals.shape[1]:
+            val = vals[row, col]
+            if val is not None and val == val:
+                return float(val)
+    return np.nan
 
 
 def get_stmt_value(df, keys, col=0):
@@ -142,7 +207,7 @@ def get_stmt_value(df, keys, col=0):
 # ---------------------------------------------------------------------------
 # ROIC calculation
 # ---------------------------------------------------------------------------
-def calculate_roic(ticker_obj, info):
+def calculate_roic(fin, bs, info):
     """Calculate Return on Invested Capital.
 
     ROIC = EBIT / Invested Capital
@@ -151,9 +216,6 @@ def calculate_roic(ticker_obj, info):
     Falls back to ROE from ticker.info if statements are unavailable.
     """
     try:
-        fin = ticker_obj.financials
-        bs = ticker_obj.balance_sheet
-
         if fin is not None and not fin.empty and bs is not None and not bs.empty:
             ebit = get_stmt_value(fin, ["EBIT", "Operating Income"])
             total_assets = get_stmt_value(bs, ["Total Assets"])
@@ -184,127 +246,114 @@ def calculate_roic(ticker_obj, info):
 # ---------------------------------------------------------------------------
 # Piotroski F-Score (0-9)
 # ---------------------------------------------------------------------------
-def calculate_piotroski(ticker_obj, info):
-    """Calculate Piotroski F-Score.
+def extract_piotroski_inputs(fin, bs, cf, info):
+    """Pull the raw statement values behind the 9 Piotroski tests.
 
-    9 binary tests across three categories:
-      Profitability (4 pts): positive ROA, positive OCF, improving ROA, OCF > NI
-      Leverage (3 pts): decreasing debt, improving current ratio, no dilution
-      Efficiency (2 pts): improving gross margin, improving asset turnover
+    Returns a flat dict of floats (NaN for anything missing) keyed by
+    field name with `_0` (current year) / `_1` (prior year) suffixes.
+    Scoring happens in one vectorized pass over all tickers in
+    calculate_piotroski_scores.
     """
-    score = 0
+    # One ndarray + label-index per statement; every field read below is
+    # then a dict hit and an array access instead of a df.loc Series.
+    fin_lk = stmt_lookup(fin)
+    bs_lk = stmt_lookup(bs)
+    cf_lk = stmt_lookup(cf)
+
+    inputs = {
+        "roa": safe(info.get("returnOnAssets")) or np.nan,
+        "ocf": lookup_value(
+            cf_lk, ["Operating Cash Flow", "Total Cash From Operating Activities"]
+        ),
+    }
 
-    try:
-        fin = ticker_obj.financials
-        bs = ticker_obj.balance_sheet
-        cf = ticker_obj.cashflow
-
-        has_multi_year = (
-            fin is not None
-            and not fin.empty
-            and len(fin.columns) >= 2
-            and bs is not None
-            and not bs.empty
-            and len(bs.columns) >= 2
-        )
+    has_multi_year = (
+        fin_lk is not None
+        and fin_lk[0].shape[1] >= 2
+        and bs_lk is not None
+        and bs_lk[0].shape[1] >= 2
+    )
 
-        # ---- Profitability (4 points) ----
+    fields = [
+        ("net_income", fin_lk, ["Net Income"]),
+        ("gross_profit", fin_lk, ["Gross Profit"]),
+        ("revenue", fin_lk, ["Total Revenue"]),
+        ("total_assets", bs_lk, ["Total Assets"]),
+        ("long_term_debt", bs_lk, ["Long Term Debt", "Long Term Debt And Capital Lease Obligation"]),
+        ("current_assets", bs_lk, ["Current Assets", "Total Current Assets"]),
+        ("current_liabilities", bs_lk, ["Current Liabilities", "Total Current Liabilities"]),
+        ("shares", bs_lk, ["Share Issued", "Ordinary Shares Number"]),
+    ]
+    for name, lookup, keys in fields:
+        inputs[f"{name}_0"] = lookup_value(lookup, keys, col=0)
+        # Prior-year values stay NaN without two years of statements, so
+        # every improvement test scores 0 — same as the old guards.
+        inputs[f"{name}_1"] = lookup_value(lookup, keys, col=1) if has_multi_year else np.nan
 
-        # 1. Positive ROA
-        roa = info.get("returnOnAssets")
-        if roa is not None and not pd.isna(roa) and roa > 0:
-            score += 1
+    return inputs
 
-        # 2. Positive operating cash flow
-        ocf = get_stmt_value(
-            cf, ["Operating Cash Flow", "Total Cash From Operating Activities"]
-        )
-        if ocf is not None and ocf > 0:
-            score += 1
-
-        # 3. ROA improving vs prior year
-        if has_multi_year:
-            ni_curr = get_stmt_value(fin, ["Net Income"], col=0)
-            ni_prev = get_stmt_value(fin, ["Net Income"], col=1)
-            ta_curr = get_stmt_value(bs, ["Total Assets"], col=0)
-            ta_prev = get_stmt_value(bs, ["Total Assets"], col=1)
-            if all(
-                v is not None and v > 0 for v in [ni_curr, ta_curr, ni_prev, ta_prev]
-            ):
-                if (ni_curr / ta_curr) > (ni_prev / ta_prev):
-                    score += 1
-
-        # 4. Cash flow from operations > Net Income (accrual quality)
-        ni = get_stmt_value(fin, ["Net Income"])
-        if ocf is not None and ni is not None and ocf > ni:
-            score += 1
-
-        # ---- Leverage, Liquidity (3 points) ----
-
-        # 5. Decreasing long-term debt
-        if has_multi_year:
-            debt_curr = get_stmt_value(
-                bs, ["Long Term Debt", "Long Term Debt And Capital Lease Obligation"], col=0
-            )
-            debt_prev = get_stmt_value(
-                bs, ["Long Term Debt", "Long Term Debt And Capital Lease Obligation"], col=1
-            )
-            if debt_curr is not None and debt_prev is not None:
-                if debt_curr <= debt_prev:
-                    score += 1
-
-        # 6. Improving current ratio
-        if has_multi_year:
-            ca_curr = get_stmt_value(bs, ["Current Assets", "Total Current Assets"], col=0)
-            ca_prev = get_stmt_value(bs, ["Current Assets", "Total Current Assets"], col=1)
-            cl_curr = get_stmt_value(bs, ["Current Liabilities", "Total Current Liabilities"], col=0)
-            cl_prev = get_stmt_value(bs, ["Current Liabilities", "Total Current Liabilities"], col=1)
-            if all(v is not None and v > 0 for v in [ca_curr, cl_curr, ca_prev, cl_prev]):
-                if (ca_curr / cl_curr) > (ca_prev / cl_prev):
-                    score += 1
-
-        # 7. No share dilution
-        if has_multi_year:
-            sh_curr = get_stmt_value(bs, ["Share Issued", "Ordinary Shares Number"], col=0)
-            sh_prev = get_stmt_value(bs, ["Share Issued", "Ordinary Shares Number"], col=1)
-            if sh_curr is not None and sh_prev is not None:
-                if sh_curr <= sh_prev:
-                    score += 1
-
-        # ---- Operating Efficiency (2 points) ----
-
-        # 8. Improving gross margin
-        if has_multi_year:
-            gp_curr = get_stmt_value(fin, ["Gross Profit"], col=0)
-            gp_prev = get_stmt_value(fin, ["Gross Profit"], col=1)
-            rev_curr = get_stmt_value(fin, ["Total Revenue"], col=0)
-            rev_prev = get_stmt_value(fin, ["Total Revenue"], col=1)
-            if all(v is not None and v > 0 for v in [gp_curr, rev_curr, gp_prev, rev_prev]):
-                if (gp_curr / rev_curr) > (gp_prev / rev_prev):
-                    score += 1
-
-        # 9. Improving asset turnover
-        if has_multi_year:
-            rev_curr = get_stmt_value(fin, ["Total Revenue"], col=0)
-            rev_prev = get_stmt_value(fin, ["Total Revenue"], col=1)
-            ta_curr = get_stmt_value(bs, ["Total Assets"], col=0)
-            ta_prev = get_stmt_value(bs, ["Total Assets"], col=1)
-            if all(v is not None and v > 0 for v in [rev_curr, ta_curr, rev_prev, ta_prev]):
-                if (rev_curr / ta_curr) > (rev_prev / ta_prev):
-                    score += 1
 
-    except Exception as e:
-        log.debug(f"Piotroski error: {e}")
+PIOTROSKI_INPUT_COLS = [
+    "roa", "ocf",
+    "net_income_0", "net_income_1", "total_assets_0", "total_assets_1",
+    "long_term_debt_0", "long_term_debt_1",
+    "current_assets_0", "current_assets_1",
+    "current_liabilities_0", "current_liabilities_1",
+    "shares_0", "shares_1", "gross_profit_0", "gross_profit_1",
+    "revenue_0", "revenue_1",
+]
+
 
+def _piotroski_kernel(roa, ocf, ni0, ni1, ta0, ta1, ltd0, ltd1,
+                      ca0, ca1, cl0, cl1, sh0, sh1, gp0, gp1, rev0, rev1):
+    """The 9 Piotroski tests as pure float-array arithmetic.
+
+    NaN inputs compare False (IEEE semantics), so missing data never
+    scores a point — matching the old per-ticker None guards.
+    """
+    # ---- Profitability (4 points) ----
+    score = (roa > 0).astype(np.int8)
+    score += ocf > 0
+    score += (ni0 > 0) & (ta0 > 0) & (ni1 > 0) & (ta1 > 0) & (ni0 / ta0 > ni1 / ta1)
+    score += ocf > ni0
+    # ---- Leverage, Liquidity (3 points) ----
+    score += ltd0 <= ltd1
+    score += (ca0 > 0) & (cl0 > 0) & (ca1 > 0) & (cl1 > 0) & (ca0 / cl0 > ca1 / cl1)
+    score += sh0 <= sh1
+    # ---- Operating Efficiency (2 points) ----
+    score += (gp0 > 0) & (rev0 > 0) & (gp1 > 0) & (rev1 > 0) & (gp0 / rev0 > gp1 / rev1)
+    score += (rev0 > 0) & (ta0 > 0) & (rev1 > 0) & (ta1 > 0) & (rev0 / ta0 > rev1 / ta1)
     return score
 
 
+def calculate_piotroski_scores(inputs_by_ticker):
+    """Calculate Piotroski F-Scores for all tickers in one vectorized pass.
+
+    9 binary tests across three categories:
+      Profitability (4 pts): positive ROA, positive OCF, improving ROA, OCF > NI
+      Leverage (3 pts): decreasing debt, improving current ratio, no dilution
+      Efficiency (2 pts): improving gross margin, improving asset turnover
+    """
+    df = pd.DataFrame.from_dict(inputs_by_ticker, orient="index")
+    if df.empty:
+        return {}
+
+    arrays = (df[c].to_numpy(dtype=np.float64) for c in PIOTROSKI_INPUT_COLS)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        scores = _piotroski_kernel(*arrays)
+    return {ticker: int(s) for ticker, s in zip(df.index, scores)}
+
+
 # ---------------------------------------------------------------------------
 # Fetch data for a single ticker
 # ---------------------------------------------------------------------------
-def fetch_ticker_data(symbol):
-    """Fetch all fundamental data for one ticker and return a metrics dict."""
-    t = yf.Ticker(symbol)
+def fetch_ticker_data(symbol, ticker_obj=None):
+    """Fetch all fundamental data for one ticker and return a metrics dict.
+
+    Pass a Ticker from a shared `yf.Tickers` batch so all symbols reuse
+    one HTTP session instead of opening a connection per symbol.
+    """
+    t = ticker_obj if ticker_obj is not None else yf.Ticker(symbol)
     info = t.info
 
     if not info or info.get("regularMarketPrice") is None:
@@ -355,11 +404,18 @@ def fetch_ticker_data(symbol):
     else:
         metrics["fcf_yield"] = None
 
+    # Statements are lazy yfinance properties: read each once and share
+    # between ROIC and Piotroski instead of re-triggering fetch/parse.
+    fin = t.financials
+    bs = t.balance_sheet
+    cf = t.cashflow
+
     # ROIC (from financial statements, with fallback)
-    metrics["roic"] = calculate_roic(t, info)
+    metrics["roic"] = calculate_roic(fin, bs, info)
 
-    # Piotroski F-Score (0-9)
-    metrics["piotroski_score"] = calculate_piotroski(t, info)
+    # Raw Piotroski inputs; the F-Score itself is computed vectorized
+    # across all tickers once the fetch phase is done.
+    metrics["_pio_inputs"] = extract_piotroski_inputs(fin, bs, cf, info)
 
     return metrics
 
@@ -367,87 +423,213 @@ def fetch_ticker_data(symbol):
 # ---------------------------------------------------------------------------
 # Database operations
 # ---------------------------------------------------------------------------
-def upsert_stock(engine, ticker, m):
-    """Insert or update stock master record."""
-    with engine.begin() as conn:
-        conn.execute(
-            text("""
-                INSERT INTO stocks (ticker, company_name, sector, industry, updated_at)
-                VALUES (:ticker, :name, :sector, :industry, NOW())
-                ON CONFLICT (ticker) DO UPDATE SET
-                    company_name = EXCLUDED.company_name,
-                    sector = EXCLUDED.sector,
-                    industry = EXCLUDED.industry,
-                    updated_at = NOW()
-            """),
-            {"ticker": ticker, "name": m["company_name"], "sector": m["sector"], "industry": m["industry"]},
-        )
+METRIC_COLS = [
+    "price", "market_cap", "enterprise_value",
+    "trailing_pe", "forward_pe", "price_to_book", "ev_to_ebitda",
+    "earnings_yield", "fcf_yield",
+    "roic", "roe", "roa", "gross_margin", "operating_margin", "net_margin",
+    "debt_to_equity", "current_ratio",
+    "revenue_growth", "earnings_growth",
+    "piotroski_score",
+]
+
+BATCH_SIZE = 1000
+
+# SQL built once at import: SQLAlchemy parses text() and compiles the bind
+# map a single time instead of on every call.
+UPSERT_STOCKS_SQL = """
+    INSERT INTO stocks (ticker, company_name, sector, industry, updated_at)
+    VALUES %s
+    ON CONFLICT (ticker) DO UPDATE SET
+        company_name = EXCLUDED.company_name,
+        sector = EXCLUDED.sector,
+        industry = EXCLUDED.industry,
+        updated_at = NOW()
+"""
 
+UPSERT_METRICS_SQL = f"""
+    INSERT INTO stock_metrics (ticker, calc_date, {", ".join(METRIC_COLS)}, updated_at)
+    VALUES %s
+    ON CONFLICT (ticker, calc_date) DO UPDATE SET
+        {", ".join(f"{c} = EXCLUDED.{c}" for c in METRIC_COLS)}, updated_at = NOW()
+"""
 
-def upsert_metrics(engine, ticker, m):
-    """Insert or update today's metrics for a ticker."""
-    today = date.today()
-    params = {"ticker": ticker, "calc_date": today}
-    cols = [
-        "price", "market_cap", "enterprise_value",
-        "trailing_pe", "forward_pe", "price_to_book", "ev_to_ebitda",
-        "earnings_yield", "fcf_yield",
-        "roic", "roe", "roa", "gross_margin", "operating_margin", "net_margin",
-        "debt_to_equity", "current_ratio",
-        "revenue_growth", "earnings_growth",
-        "piotroski_score",
+METRICS_ROW_TEMPLATE = "(" + ", ".join(["%s"] * (len(METRIC_COLS) + 2)) + ", NOW())"
+
+# At four-digit universes COPY into a staging table beats parameterized
+# INSERTs by an order of magnitude; below that execute_values is simpler.
+COPY_THRESHOLD = 1024
+
+METRICS_STAGE_DDL = """
+    CREATE TEMP TABLE stock_metrics_stage
+    (LIKE stock_metrics INCLUDING DEFAULTS) ON COMMIT DROP
+"""
+
+METRICS_COPY_SQL = f"""
+    COPY stock_metrics_stage (ticker, calc_date, {", ".join(METRIC_COLS)})
+    FROM STDIN WITH (FORMAT CSV, NULL '')
+"""
+
+METRICS_STAGE_UPSERT_SQL = f"""
+    INSERT INTO stock_metrics (ticker, calc_date, {", ".join(METRIC_COLS)}, updated_at)
+    SELECT ticker, calc_date, {", ".join(METRIC_COLS)}, NOW()
+    FROM stock_metrics_stage
+    ON CONFLICT (ticker, calc_date) DO UPDATE SET
+        {", ".join(f"{c} = EXCLUDED.{c}" for c in METRIC_COLS)}, updated_at = NOW()
+"""
+
+RANKING_COLS = [
+    "ticker", "earnings_yield", "roic", "fcf_yield",
+    "debt_to_equity", "revenue_growth", "gross_margin", "piotroski_score",
+]
+
+RANKING_SELECT_SQL = text(f"""
+    SELECT {", ".join(RANKING_COLS)}
+    FROM stock_metrics
+    WHERE calc_date = :today
+""")
+
+# execute_values form: all rows land in one UPDATE ... FROM (VALUES ...)
+# statement, same as the upsert paths below. A plain executemany here
+# would still be a client-side loop — psycopg2 only batches INSERTs.
+RANKING_UPDATE_SQL = """
+    UPDATE stock_metrics AS m
+    SET magic_formula_rank = v.mf, composite_score = v.score,
+        signal = v.signal, updated_at = NOW()
+    FROM (VALUES %s) AS v(ticker, calc_date, mf, score, signal)
+    WHERE m.ticker = v.ticker AND m.calc_date = v.calc_date
+"""
+
+
+def upsert_stocks(engine, results):
+    """Bulk insert/update stock master records for all fetched tickers."""
+    rows = [
+        (ticker, m["company_name"], m["sector"], m["industry"])
+        for ticker, m in results.items()
     ]
-    for col in cols:
-        params[col] = m.get(col)
+    if not rows:
+        return
+    raw = engine.raw_connection()
+    try:
+        with raw.cursor() as cur:
+            execute_values(
+                cur,
+                UPSERT_STOCKS_SQL,
+                rows,
+                template="(%s, %s, %s, %s, NOW())",
+                page_size=BATCH_SIZE,
+            )
+        raw.commit()
+    finally:
+        raw.close()
 
-    col_list = ", ".join(cols)
-    val_list = ", ".join(f":{c}" for c in cols)
-    update_list = ", ".join(f"{c} = EXCLUDED.{c}" for c in cols)
 
-    with engine.begin() as conn:
-        conn.execute(
-            text(f"""
-                INSERT INTO stock_metrics (ticker, calc_date, {col_list}, updated_at)
-                VALUES (:ticker, :calc_date, {val_list}, NOW())
-                ON CONFLICT (ticker, calc_date) DO UPDATE SET
-                    {update_list}, updated_at = NOW()
-            """),
-            params,
-        )
+def _bulk_copy_metrics(raw, rows):
+    """COPY rows into a temp staging table, then upsert from it in one go."""
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    for row in rows:
+        writer.writerow(["" if v is None else v for v in row])
+    buf.seek(0)
+
+    with raw.cursor() as cur:
+        cur.execute(METRICS_STAGE_DDL)
+        cur.copy_expert(METRICS_COPY_SQL, buf)
+        cur.execute(METRICS_STAGE_UPSERT_SQL)
+
+
+def upsert_metrics(engine, results):
+    """Bulk insert/update today's metrics for all fetched tickers."""
+    today = date.today()
+    rows = [
+        tuple([ticker, today] + [m.get(c) for c in METRIC_COLS])
+        for ticker, m in results.items()
+    ]
+    if not rows:
+        return
+
+    raw = engine.raw_connection()
+    try:
+        if len(rows) >= COPY_THRESHOLD:
+            _bulk_copy_metrics(raw, rows)
+        else:
+            with raw.cursor() as cur:
+                execute_values(
+                    cur,
+                    UPSERT_METRICS_SQL,
+                    rows,
+                    template=METRICS_ROW_TEMPLATE,
+                    page_size=BATCH_SIZE,
+                )
+        raw.commit()
+    finally:
+        raw.close()
 
 
 # ---------------------------------------------------------------------------
 # Ranking and composite score
 # ---------------------------------------------------------------------------
+def _rankdata(x):
+    """Average-tie ranks (1-based, ascending, NaN last) of a 1-D array.
+
+    Pure argsort equivalent of Series.rank(na_option="bottom") that
+    stays in contiguous NumPy memory; pass a negated array for
+    descending ranks.
+    """
+    x = np.where(np.isnan(x), np.inf, x)
+    order = np.argsort(x, kind="stable")
+    sx = x[order]
+    # Tied runs share the average of the positions they occupy
+    starts = np.r_[True, sx[1:] != sx[:-1]]
+    group_start = np.flatnonzero(starts)
+    counts = np.diff(np.r_[group_start, len(sx)])
+    avg_rank = group_start + (counts + 1) / 2.0
+    ranks = np.empty(len(sx))
+    ranks[order] = avg_rank[np.cumsum(starts) - 1]
+    return ranks
+
+
 def calculate_rankings(engine):
     """Calculate Magic Formula ranks and composite buy/sell scores."""
     today = date.today()
 
-    df = pd.read_sql(
-        text("""
-            SELECT ticker, earnings_yield, roic, fcf_yield,
-                   debt_to_equity, revenue_growth, gross_margin, piotroski_score
-            FROM stock_metrics
-            WHERE calc_date = :today
-        """),
-        engine,
-        params={"today": today},
-    )
+    # One connection and transaction for the read and the write-back, so
+    # SQLAlchemy isn't re-acquiring from the pool and committing twice.
+    with engine.begin() as conn:
+        # Known 8-column projection: build the frame straight from the
+        # fetched rows and skip pd.read_sql's cursor introspection. The
+        # float32 downcast below also turns the NUMERIC Decimals into floats.
+        rows = conn.execute(RANKING_SELECT_SQL, {"today": today}).fetchall()
+        df = pd.DataFrame.from_records(rows, columns=RANKING_COLS)
+        _rank_and_store(conn, df, today)
+
 
+def _rank_and_store(conn, df, today):
+    """Rank today's metrics frame and write scores back on `conn`."""
     if df.empty:
         log.warning("No metrics for today, skipping ranking")
         return
 
+    # Downcast before ranking: read_sql hands back float64 everywhere, but
+    # the rank/percentile pipeline is exact in 4-byte lanes (piotroski_score
+    # stays float since the column is nullable).
+    df["ticker"] = df["ticker"].astype("category")
+    num_cols = df.columns.drop("ticker")
+    df[num_cols] = df[num_cols].astype(np.float32)
+
     # -- Magic Formula: rank by ROIC + Earnings Yield --
-    roic_rank = df["roic"].rank(ascending=False, na_option="bottom")
-    ey_rank = df["earnings_yield"].rank(ascending=False, na_option="bottom")
-    df["magic_formula_rank"] = (roic_rank + ey_rank).rank(ascending=True).astype(int)
+    # argsort-based ranks on the float32 arrays: three pandas .rank()
+    # passes become C-level sorts with no NaN-handling per-row overhead.
+    roic_rank = _rankdata(-df["roic"].to_numpy(dtype=np.float32))
+    ey_rank = _rankdata(-df["earnings_yield"].to_numpy(dtype=np.float32))
+    combined_rank = roic_rank + ey_rank
+    df["magic_formula_rank"] = _rankdata(combined_rank).astype(int)
 
     # -- Percentile ranks for each component (0-100, higher = better) --
     def pct(series, ascending=False):
         return series.rank(ascending=ascending, na_option="bottom", pct=True) * 100
 
-    mf_pct = pct(-(roic_rank + ey_rank))                    # Lower combined rank = better
+    mf_pct = pct(pd.Series(-combined_rank, index=df.index))  # Lower combined rank = better
     pio_pct = pct(df["piotroski_score"])
     fcf_pct = pct(df["fcf_yield"])
     de_pct = pct(df["debt_to_equity"], ascending=True)       # Lower debt = better
@@ -468,32 +650,30 @@ def calculate_rankings(engine):
         + de_pct * w_de + rg_pct * w_rg + gm_pct * w_gm
     )
 
-    # -- Buy / Hold / Sell signal --
-    df["signal"] = df["composite_score"].apply(
-        lambda x: "BUY" if x >= 70 else ("SELL" if x <= 30 else "HOLD")
-    )
-
-    # -- Write back to database --
-    with engine.begin() as conn:
-        for _, row in df.iterrows():
-            conn.execute(
-                text("""
-                    UPDATE stock_metrics
-                    SET magic_formula_rank = :mf, composite_score = :score,
-                        signal = :signal, updated_at = NOW()
-                    WHERE ticker = :ticker AND calc_date = :today
-                """),
-                {
-                    "ticker": row["ticker"],
-                    "today": today,
-                    "mf": int(row["magic_formula_rank"]),
-                    "score": round(float(row["composite_score"]), 2),
-                    "signal": row["signal"],
-                },
-            )
+    # -- Buy / Hold / Sell signal (vectorized, no per-row lambda) --
+    scores = df["composite_score"].to_numpy()
+    df["signal"] = np.select([scores >= 70, scores <= 30], ["BUY", "SELL"], default="HOLD")
+
+    # -- Write back to database (one bulk statement, not a row per ticker) --
+    # Through the transaction's own DBAPI cursor: execute_values joins the
+    # VALUES rows into a single UPDATE, and conn's engine.begin() block
+    # still owns the commit.
+    updates = [
+        (
+            row["ticker"],
+            today,
+            int(row["magic_formula_rank"]),
+            round(float(row["composite_score"]), 2),
+            row["signal"],
+        )
+        for _, row in df.iterrows()
+    ]
+    with conn.connection.cursor() as cur:
+        execute_values(cur, RANKING_UPDATE_SQL, updates, page_size=BATCH_SIZE)
 
-    # -- Print summary --
-    top = df.nlargest(10, "composite_score")[
+    # -- Print summary (one sort, reused for the top-10 slice) --
+    df.sort_values("composite_score", ascending=False, inplace=True)
+    top = df.head(10)[
         ["ticker", "composite_score", "signal", "magic_formula_rank", "piotroski_score"]
     ]
     log.info(f"\n{'='*60}")
@@ -501,9 +681,8 @@ def calculate_rankings(engine):
     log.info(f"{'='*60}")
     log.info(f"\n{top.to_string(index=False)}")
 
-    buys = len(df[df["signal"] == "BUY"])
-    holds = len(df[df["signal"] == "HOLD"])
-    sells = len(df[df["signal"] == "SELL"])
+    counts = df["signal"].value_counts()
+    buys, holds, sells = (counts.get(k, 0) for k in ("BUY", "HOLD", "SELL"))
     log.info(f"\nSignals: {buys} BUY | {holds} HOLD | {sells} SELL")
 
 
@@ -513,39 +692,63 @@ def calculate_rankings(engine):
 def main():
     log.info("Stock Analyzer starting...")
 
-    engine = create_engine(DATABASE_URL)
+    # Pooled, pre-pinged connections: upserts and ranking reuse pooled
+    # connections instead of re-dialing, and stale ones are recycled.
+    engine = create_engine(DATABASE_URL, pool_size=8, pool_pre_ping=True)
     create_tables(engine)
 
     tickers = get_tickers()
-    log.info(f"Processing {len(tickers)} tickers...")
-
-    success = 0
+    log.info(f"Processing {len(tickers)} tickers with {FETCH_THREADS} threads...")
+
+    # -- Fetch phase: threaded, rate-limited --
+    # Cached session (when requests_cache is installed): a same-day rerun
+    # serves identical info/statement responses from disk.
+    session = None
+    if requests_cache is not None:
+        session = requests_cache.CachedSession(YF_CACHE, expire_after=YF_CACHE_TTL)
+        log.info(f"HTTP cache enabled: {YF_CACHE} (TTL {YF_CACHE_TTL}s)")
+
+    # One yf.Tickers batch up front: every symbol shares a single session
+    # (and connection pool) instead of a fresh yf.Ticker per call.
+    tickers_obj = yf.Tickers(" ".join(tickers), session=session)
+    limiter = RateLimiter(DELAY)
+
+    def fetch_one(symbol):
+        limiter.wait()
+        return fetch_ticker_data(symbol, tickers_obj.tickers.get(symbol.upper()))
+
+    results = {}
     errors = 0
 
-    for i, symbol in enumerate(tickers, 1):
-        try:
-            log.info(f"[{i}/{len(tickers)}] {symbol}")
-            metrics = fetch_ticker_data(symbol)
+    with ThreadPoolExecutor(max_workers=FETCH_THREADS) as pool:
+        futures = {pool.submit(fetch_one, s): s for s in tickers}
+        for i, future in enumerate(as_completed(futures), 1):
+            symbol = futures[future]
+            try:
+                metrics = future.result()
+            except Exception as e:
+                log.error(f"[{i}/{len(tickers)}] {symbol}: {e}")
+                errors += 1
+                continue
 
             if metrics:
-                upsert_stock(engine, symbol, metrics)
-                upsert_metrics(engine, symbol, metrics)
-                pio = metrics.get("piotroski_score", "?")
+                results[symbol] = metrics
                 roic = metrics.get("roic")
                 roic_str = f"{roic:.1%}" if roic else "N/A"
-                log.info(f"  -> F-Score: {pio}/9, ROIC: {roic_str}")
-                success += 1
+                log.info(f"[{i}/{len(tickers)}] {symbol} -> ROIC: {roic_str}")
             else:
                 errors += 1
 
-            if i < len(tickers):
-                time.sleep(DELAY)
+    # -- Score phase: Piotroski F-Scores for all tickers in one pass --
+    pio_inputs = {s: m.pop("_pio_inputs") for s, m in results.items()}
+    for symbol, score in calculate_piotroski_scores(pio_inputs).items():
+        results[symbol]["piotroski_score"] = score
 
-        except Exception as e:
-            log.error(f"  Error: {e}")
-            errors += 1
+    # -- Store phase: batched DB writes on the main thread --
+    upsert_stocks(engine, results)
+    upsert_metrics(engine, results)
 
-    log.info(f"\nFetch complete: {success} ok, {errors} failed")
+    log.info(f"\nFetch complete: {len(results)} ok, {errors} failed")
 
     log.info("Calculating rankings and composite scores...")
     calculate_rankings(engine)
@@ -18,12 +18,20 @@ import os
 import sys
 import time
 import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import date, timedelta
 
 import yfinance as yf
 import pandas as pd
 import numpy as np
-from sqlalchemy import create_engine, text
+from psycopg2.extras import execute_values
+from sqlalchemy import create_engine
+
+try:
+    import requests_cache
+except ImportError:  # optional - re-runs just hit the network again
+    requests_cache = None
 
 logging.basicConfig(
     level=logging.INFO,
@@ -42,6 +50,10 @@ DB_USER = os.environ.get("DB_USER", "postgres")
 DB_PASS = os.environ.get("DB_PASS", "postgres")
 TICKERS_FILE = os.environ.get("TICKERS_FILE", "/config/tickers.txt")
 DELAY = float(os.environ.get("DELAY_SECONDS", "1.5"))
+FETCH_THREADS = int(os.environ.get("FETCH_THREADS", "8"))
+YF_CACHE = os.environ.get("YF_CACHE", "/tmp/yfcache")
+# Annual statements only change quarterly; a day of caching is safe
+YF_CACHE_TTL = int(os.environ.get("YF_CACHE_TTL", "86400"))
 
 DATABASE_URL = f"postgresql://{DB_USER}:{DB_PASS}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
 
@@ -120,109 +132,196 @@ def get_tickers():
         return [line.strip() for line in f if line.strip() and not line.startswith("#")]
 
 
+class RateLimiter:
+    """Token-bucket style limiter shared by fetch workers.
+
+    Enforces one request per `interval` seconds globally, so total QPS
+    against yfinance stays at the old 1/DELAY rate no matter how many
+    worker threads are fetching.
+    """
+
+    def __init__(self, interval):
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._next_at = 0.0
+
+    def wait(self):
+        with self._lock:
+            now = time.monotonic()
+            sleep_for = self._next_at - now
+            self._next_at = max(now, self._next_at) + self.interval
+        if sleep_for > 0:
+            time.sleep(sleep_for)
+
+
 def create_tables(engine):
     """Create tables if they don't exist."""
     with engine.begin() as conn:
-        for stmt in SCHEMA_SQL.split(";"):
-            stmt = stmt.strip()
-            if stmt:
-                conn.execute(text(stmt))
+        # psycopg2 takes the whole multi-statement DDL in one round-trip
+        conn.exec_driver_sql(SCHEMA_SQL)
     log.info("Database tables ready")
 
 
 def safe(val):
-    """Return None for NaN/Inf values, pass through everything else."""
+    """Return None for None/NaN/Inf/non-numeric values, else float(val).
+
+    Scalar fast path as in analyzer.py: float() plus the `f != f` NaN
+    idiom replaces the generic pd.isna/np.isinf dispatch this helper was
+    paying on every info field.
+    """
     if val is None:
         return None
     try:
-        if pd.isna(val) or np.isinf(val):
-            return None
+        f = float(val)
     except (TypeError, ValueError):
-        pass
-    return float(val)
+        return None
+    if f != f or f == float("inf") or f == float("-inf"):
+        return None
+    return f
+
 
+def stmt_lookup(df):
+    """Materialize a statement DataFrame as (ndarray, {label: row index}).
 
-def get_stmt_value(df, keys, col=0):
-    """Safely get a value from a financial statement DataFrame."""
+    Same trick as analyzer.py: one conversion per statement replaces each
+    df.empty check plus df.loc[key] Series allocation with a dict hit and
+    a C-level array read. Returns None for a missing/empty statement.
+    """
     if df is None or df.empty:
         return None
-    for key in keys if isinstance(keys, list) else [keys]:
-        if key in df.index:
-            try:
-                val = df.loc[key].iloc[col]
-                if not pd.isna(val):
-                    return float(val)
-            except (IndexError, KeyError):
-                pass
-    return None
+    return df.to_numpy(), {lbl: i for i, lbl in enumerate(df.index)}
 
 
-def calculate_cagr(start_val, end_val, years):
-    """CAGR = (end/start)^(1/years) - 1. Returns None if inputs are invalid."""
-    if start_val is None or end_val is None or years is None or years <= 0:
-        return None
-    if start_val <= 0 or end_val <= 0:
-        return None
-    try:
-        return (end_val / start_val) ** (1.0 / years) - 1.0
-    except (ZeroDivisionError, ValueError, OverflowError):
+def lookup_value(lookup, keys, col=0):
+    """Get a statement value from a stmt_lookup() tuple.
+
+    `keys` is a sequence of alias labels (usually a METRIC_ALIASES
+    tuple), tried in order. Returns None if not found or NaN.
+    """
+    if lookup is None:
         return None
+    vals, idx = lookup
+    for key in keys:
+        row = idx.get(key)
+        if row is not None and col < vals.shape[1]:
+            val = vals[row, col]
+            if val is not None and val == val:
+                return float(val)
+    return None
 
 
-def yoy_growth(current, prior):
-    """Calculate year-over-year growth rate."""
-    if current is None or prior is None or prior == 0:
-        return None
-    return (current - prior) / abs(prior)
+def cagr_vector(start, end, years):
+    """CAGR = (end/start)^(1/years) - 1 over aligned float arrays.
+
+    NaN marks invalid entries (missing endpoint, endpoint <= 0, or an
+    overflowed result); callers map NaN back to None. A years value of
+    None or <= 0 invalidates the whole horizon.
+    """
+    if years is None or years <= 0:
+        return np.full(start.shape, np.nan)
+    valid = (start > 0) & (end > 0)  # NaN endpoints compare False
+    with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+        out = np.where(valid, (end / start) ** (1.0 / years) - 1.0, np.nan)
+    out[~np.isfinite(out)] = np.nan
+    return out
+
+
+# Annual metric columns in rule1_annual order; YoY keys line up 1:1
+ANNUAL_RAW_KEYS = [
+    "roic_pct", "book_value_per_share", "earnings_per_share",
+    "revenue_mil", "fcf_mil", "avg_share_price", "avg_pe",
+]
+ANNUAL_YOY_KEYS = [
+    "roic_yoy", "bvps_yoy", "eps_yoy", "revenue_yoy",
+    "fcf_yoy", "price_yoy", "pe_yoy",
+]
+
+# CAGR mappings: (annual_key, ttm_key, cagr_full_key, cagr_recent_key)
+CAGR_MAP = [
+    ("roic_pct", "roic_ttm", "roic_cagr_full", "roic_cagr_recent"),
+    ("book_value_per_share", "bvps_ttm", "bvps_cagr_full", "bvps_cagr_recent"),
+    ("earnings_per_share", "eps_ttm", "eps_cagr_full", "eps_cagr_recent"),
+    ("revenue_mil", "revenue_ttm_mil", "revenue_cagr_full", "revenue_cagr_recent"),
+    ("fcf_mil", "fcf_ttm_mil", "fcf_cagr_full", "fcf_cagr_recent"),
+    ("avg_share_price", "price_current", "price_cagr_full", "price_cagr_recent"),
+    ("avg_pe", "pe_ttm", "pe_cagr_full", "pe_cagr_recent"),
+]
 
 
 def get_fiscal_years(df):
     """Extract sorted list of fiscal years from a financial statement DataFrame.
 
     Returns list of (year_int, col_index) tuples sorted oldest-first.
+    Years come off the columns as one vectorized datetime conversion;
+    non-date columns coerce to NaT and are dropped.
     """
     if df is None or df.empty:
         return []
-    years = []
-    for i, col in enumerate(df.columns):
-        try:
-            yr = col.year
-            years.append((yr, i))
-        except AttributeError:
-            pass
-    years.sort(key=lambda x: x[0])
-    return years
+    years = pd.to_datetime(df.columns, errors="coerce").year.to_numpy(dtype="float64")
+    valid = np.nonzero(~np.isnan(years))[0]
+    order = valid[np.argsort(years[valid], kind="stable")]
+    return [(int(years[i]), int(i)) for i in order]
 
 
 # ---------------------------------------------------------------------------
 # Annual metric extraction — each returns {year: value}
 # ---------------------------------------------------------------------------
+# Statement line items and their alias rows, tried in order
+METRIC_ALIASES = {
+    "ebit": ("EBIT", "Operating Income"),
+    "total_assets": ("Total Assets",),
+    "total_liabilities": ("Total Liabilities Net Minority Interest", "Total Liab"),
+    "current_assets": ("Current Assets", "Total Current Assets"),
+    "current_liabilities": ("Current Liabilities", "Total Current Liabilities"),
+    "inventory": ("Inventory",),
+    "cash": ("Cash And Cash Equivalents", "Cash Cash Equivalents And Short Term Investments"),
+    "equity": ("Stockholders Equity", "Total Equity Gross Minority Interest", "Common Stock Equity"),
+    "shares": ("Ordinary Shares Number", "Share Issued"),
+    "eps": ("Basic EPS", "Diluted EPS"),
+    "net_income": ("Net Income",),
+    "revenue": ("Total Revenue",),
+    "fcf": ("Free Cash Flow",),
+}
+
+
+def stmt_rows(df, names):
+    """Pull alias-coalesced line items from a statement in one reindex.
+
+    Returns {name: float ndarray over the statement's columns}, with the
+    first non-NaN alias winning per column. Replaces a per-label df.loc
+    call per key per year with a single DataFrame pull.
+    """
+    labels = [label for name in names for label in METRIC_ALIASES[name]]
+    arr = df.reindex(index=labels).to_numpy(dtype=float)
+    out = {}
+    i = 0
+    for name in names:
+        count = len(METRIC_ALIASES[name])
+        vec = arr[i]
+        for j in range(1, count):
+            vec = np.where(np.isnan(vec), arr[i + j], vec)
+        out[name] = vec
+        i += count
+    return out
+
+
 def extract_annual_roic(fin, bs):
     """Calculate ROIC % for each fiscal year."""
     result = {}
     if fin is None or fin.empty or bs is None or bs.empty:
         return result
-    years = get_fiscal_years(fin)
     bs_years = {yr: col for yr, col in get_fiscal_years(bs)}
-    for yr, col in years:
+    f = stmt_rows(fin, ["ebit"])
+    b = stmt_rows(bs, ["total_assets", "current_liabilities", "cash"])
+    cash = np.where(np.isnan(b["cash"]), 0.0, b["cash"])
+    invested_capital = b["total_assets"] - b["current_liabilities"] - cash
+    for yr, col in get_fiscal_years(fin):
         if yr not in bs_years:
             continue
-        bs_col = bs_years[yr]
-        ebit = get_stmt_value(fin, ["EBIT", "Operating Income"], col=col)
-        total_assets = get_stmt_value(bs, ["Total Assets"], col=bs_col)
-        cur_liab = get_stmt_value(
-            bs, ["Current Liabilities", "Total Current Liabilities"], col=bs_col
-        )
-        cash = get_stmt_value(
-            bs,
-            ["Cash And Cash Equivalents", "Cash Cash Equivalents And Short Term Investments"],
-            col=bs_col,
-        )
-        if ebit is not None and total_assets is not None and cur_liab is not None:
-            cash = cash or 0
-            invested_capital = total_assets - cur_liab - cash
-            if invested_capital > 0:
-                result[yr] = (ebit / invested_capital) * 100
+        ebit = f["ebit"][col]
+        ic = invested_capital[bs_years[yr]]
+        if not np.isnan(ebit) and ic > 0:
+            result[yr] = float(ebit / ic) * 100
     return result
 
 
@@ -231,17 +330,11 @@ def extract_bvps(bs):
     result = {}
     if bs is None or bs.empty:
         return result
+    b = stmt_rows(bs, ["equity", "shares"])
     for yr, col in get_fiscal_years(bs):
-        equity = get_stmt_value(
-            bs,
-            ["Stockholders Equity", "Total Equity Gross Minority Interest", "Common Stock Equity"],
-            col=col,
-        )
-        shares = get_stmt_value(
-            bs, ["Ordinary Shares Number", "Share Issued"], col=col
-        )
-        if equity is not None and shares is not None and shares > 0:
-            result[yr] = equity / shares
+        equity, shares = b["equity"][col], b["shares"][col]
+        if not np.isnan(equity) and shares > 0:
+            result[yr] = float(equity / shares)
     return result
 
 
@@ -250,22 +343,20 @@ def extract_eps(fin, bs):
     result = {}
     if fin is None or fin.empty:
         return result
+    f = stmt_rows(fin, ["eps", "net_income"])
+    has_bs = bs is not None and not bs.empty
+    bs_years = {y: c for y, c in get_fiscal_years(bs)} if has_bs else {}
+    b = stmt_rows(bs, ["shares"]) if has_bs else None
     for yr, col in get_fiscal_years(fin):
-        eps = get_stmt_value(fin, ["Basic EPS", "Diluted EPS"], col=col)
-        if eps is not None:
-            result[yr] = eps
-        else:
+        eps = f["eps"][col]
+        if not np.isnan(eps):
+            result[yr] = float(eps)
+        elif yr in bs_years:
             # Fallback: Net Income / Shares Outstanding
-            ni = get_stmt_value(fin, ["Net Income"], col=col)
-            if ni is not None and bs is not None:
-                bs_years = {y: c for y, c in get_fiscal_years(bs)}
-                if yr in bs_years:
-                    shares = get_stmt_value(
-                        bs, ["Ordinary Shares Number", "Share Issued"],
-                        col=bs_years[yr],
-                    )
-                    if shares is not None and shares > 0:
-                        result[yr] = ni / shares
+            ni = f["net_income"][col]
+            shares = b["shares"][bs_years[yr]]
+            if not np.isnan(ni) and shares > 0:
+                result[yr] = float(ni / shares)
     return result
 
 
@@ -274,10 +365,11 @@ def extract_revenue(fin):
     result = {}
     if fin is None or fin.empty:
         return result
+    f = stmt_rows(fin, ["revenue"])
     for yr, col in get_fiscal_years(fin):
-        rev = get_stmt_value(fin, ["Total Revenue"], col=col)
-        if rev is not None:
-            result[yr] = rev / 1_000_000
+        rev = f["revenue"][col]
+        if not np.isnan(rev):
+            result[yr] = float(rev) / 1_000_000
     return result
 
 
@@ -286,23 +378,64 @@ def extract_fcf(cf):
     result = {}
     if cf is None or cf.empty:
         return result
+    c = stmt_rows(cf, ["fcf"])
     for yr, col in get_fiscal_years(cf):
-        fcf = get_stmt_value(cf, ["Free Cash Flow"], col=col)
-        if fcf is not None:
-            result[yr] = fcf / 1_000_000
+        fcf = c["fcf"][col]
+        if not np.isnan(fcf):
+            result[yr] = float(fcf) / 1_000_000
     return result
 
 
-def extract_avg_prices(ticker_obj, years):
+def download_avg_prices(tickers, session=None):
+    """Average yearly close per ticker from one batched history download.
+
+    A single yf.download for the whole universe replaces a 5y history
+    request per ticker. Returns {ticker: {year: avg close}}; tickers
+    missing from the batch just fall back to their own history call.
+    """
+    result = {}
+    try:
+        hist = yf.download(
+            tickers,
+            period="5y",
+            group_by="ticker",
+            threads=True,
+            progress=False,
+            session=session,
+        )
+        if hist is None or hist.empty:
+            return result
+        for symbol in tickers:
+            try:
+                closes = hist[symbol]["Close"] if len(tickers) > 1 else hist["Close"]
+            except KeyError:
+                continue
+            closes = closes.dropna()
+            if closes.empty:
+                continue
+            # History comes back chronologically ordered, so the year key
+            # is already sorted; sort=False skips the redundant sort pass.
+            by_year = closes.groupby(closes.index.year, sort=False).mean()
+            result[symbol] = {int(yr): float(val) for yr, val in by_year.items()}
+    except Exception as e:
+        log.warning(f"Batched history download failed: {e}")
+    return result
+
+
+def extract_avg_prices(ticker_obj, years, precomputed=None):
     """Get average share price per year from historical daily data."""
     result = {}
     if not years:
         return result
+    if precomputed is not None:
+        return {yr: precomputed[yr] for yr in years if yr in precomputed}
     try:
         hist = ticker_obj.history(period="5y")
         if hist is None or hist.empty:
             return result
-        hist_by_year = hist.groupby(hist.index.year)["Close"].mean()
+        # Chronological index means year keys are pre-sorted; sort=False
+        # skips the redundant sort pass (lookups below are by label).
+        hist_by_year = hist.groupby(hist.index.year, sort=False)["Close"].mean()
         for yr in years:
             if yr in hist_by_year.index:
                 val = hist_by_year[yr]
@@ -327,22 +460,22 @@ def calculate_avg_pe(avg_prices, eps_by_year):
 # ---------------------------------------------------------------------------
 # TTM and snapshot extraction
 # ---------------------------------------------------------------------------
-def extract_ttm_values(ticker_obj, info):
-    """Extract trailing-twelve-month values from ticker.info."""
+def extract_ttm_values(info, fin, bs):
+    """Extract trailing-twelve-month values from ticker.info.
+
+    Statements come in from process_ticker's single read rather than
+    re-triggering the lazy ticker properties.
+    """
     # ROIC TTM: calculate from most recent data
     roic_ttm = None
     try:
-        fin = ticker_obj.financials
-        bs = ticker_obj.balance_sheet
-        if fin is not None and not fin.empty and bs is not None and not bs.empty:
-            ebit = get_stmt_value(fin, ["EBIT", "Operating Income"], col=0)
-            ta = get_stmt_value(bs, ["Total Assets"], col=0)
-            cl = get_stmt_value(bs, ["Current Liabilities", "Total Current Liabilities"], col=0)
-            cash = get_stmt_value(
-                bs,
-                ["Cash And Cash Equivalents", "Cash Cash Equivalents And Short Term Investments"],
-                col=0,
-            )
+        fin_lk = stmt_lookup(fin)
+        bs_lk = stmt_lookup(bs)
+        if fin_lk is not None and bs_lk is not None:
+            ebit = lookup_value(fin_lk, METRIC_ALIASES["ebit"], col=0)
+            ta = lookup_value(bs_lk, METRIC_ALIASES["total_assets"], col=0)
+            cl = lookup_value(bs_lk, METRIC_ALIASES["current_liabilities"], col=0)
+            cash = lookup_value(bs_lk, METRIC_ALIASES["cash"], col=0)
             if ebit is not None and ta is not None and cl is not None:
                 cash = cash or 0
                 ic = ta - cl - cash
@@ -380,6 +513,13 @@ def extract_ttm_values(ticker_obj, info):
     }
 
 
+# Computed once at import: the job is a short-lived CronJob, so one
+# cutoff is accurate for the whole run and saves a Timestamp.now() plus
+# DateOffset arithmetic per ticker. Naive; localized at use to match
+# each dividend index's timezone.
+ONE_YEAR_AGO = pd.Timestamp.now() - pd.DateOffset(years=1)
+
+
 def extract_snapshot(ticker_obj, info, bs):
     """Extract point-in-time snapshot metrics."""
     roa = safe(info.get("returnOnAssets"))
@@ -394,7 +534,9 @@ def extract_snapshot(ticker_obj, info, bs):
         try:
             divs = ticker_obj.dividends
             if divs is not None and not divs.empty:
-                one_year_ago = pd.Timestamp.now(tz=divs.index.tz) - pd.DateOffset(years=1)
+                one_year_ago = ONE_YEAR_AGO
+                if divs.index.tz is not None:
+                    one_year_ago = one_year_ago.tz_localize(divs.index.tz)
                 dividends_ttm = float(divs[divs.index >= one_year_ago].sum())
                 if dividends_ttm == 0:
                     dividends_ttm = None
@@ -404,24 +546,21 @@ def extract_snapshot(ticker_obj, info, bs):
     div_yield = safe(info.get("dividendYield"))
     div_yield_pct = div_yield * 100 if div_yield is not None else None
 
+    # Balance-sheet derived ratios share one materialized lookup
+    bs_lk = stmt_lookup(bs)
+
     # Total liabilities from balance sheet
-    total_liab = None
-    if bs is not None and not bs.empty:
-        total_liab = get_stmt_value(
-            bs, ["Total Liabilities Net Minority Interest", "Total Liab"], col=0
-        )
+    total_liab = lookup_value(bs_lk, METRIC_ALIASES["total_liabilities"], col=0)
 
     debt_to_equity = safe(info.get("debtToEquity"))
     current_ratio = safe(info.get("currentRatio"))
 
     # Quick ratio: (Current Assets - Inventory) / Current Liabilities
     quick_ratio = None
-    if bs is not None and not bs.empty:
-        ca = get_stmt_value(bs, ["Current Assets", "Total Current Assets"], col=0)
-        inv = get_stmt_value(bs, ["Inventory"]) or 0
-        cl = get_stmt_value(
-            bs, ["Current Liabilities", "Total Current Liabilities"], col=0
-        )
+    if bs_lk is not None:
+        ca = lookup_value(bs_lk, METRIC_ALIASES["current_assets"], col=0)
+        inv = lookup_value(bs_lk, METRIC_ALIASES["inventory"]) or 0
+        cl = lookup_value(bs_lk, METRIC_ALIASES["current_liabilities"], col=0)
         if ca is not None and cl is not None and cl > 0:
             quick_ratio = (ca - inv) / cl
 
@@ -440,12 +579,24 @@ def extract_snapshot(ticker_obj, info, bs):
 # ---------------------------------------------------------------------------
 # Process a single ticker
 # ---------------------------------------------------------------------------
-def process_ticker(symbol):
+def process_ticker(symbol, session=None, avg_prices_map=None):
     """Fetch data and calculate all Rule #1 metrics for one ticker.
 
     Returns (annual_rows, summary_row) or (None, None) on failure.
     """
-    t = yf.Ticker(symbol)
+    t = yf.Ticker(symbol, session=session)
+
+    # Cheap availability pre-check: fast_info hits a lightweight quote
+    # endpoint, so dead/delisted symbols bail out before paying for the
+    # full .info payload (still needed below for the TTM/snapshot fields).
+    try:
+        last_price = t.fast_info.last_price
+    except Exception:
+        last_price = None
+    if last_price is None:
+        log.warning(f"  {symbol}: no data available, skipping")
+        return None, None
+
     info = t.info
 
     if not info or info.get("regularMarketPrice") is None:
@@ -464,53 +615,50 @@ def process_ticker(symbol):
     fcf_by_year = extract_fcf(cf)
 
     # Collect all fiscal years we have data for
-    all_years = sorted(set(
-        list(roic_by_year.keys()) + list(bvps_by_year.keys()) +
-        list(eps_by_year.keys()) + list(rev_by_year.keys()) +
-        list(fcf_by_year.keys())
-    ))
+    all_years = sorted(
+        {*roic_by_year, *bvps_by_year, *eps_by_year, *rev_by_year, *fcf_by_year}
+    )
 
     if not all_years:
         log.warning(f"  {symbol}: no annual financial data available")
         return None, None
 
     # Get average prices and PE for those years
-    avg_prices = extract_avg_prices(t, all_years)
+    avg_prices = extract_avg_prices(
+        t, all_years,
+        avg_prices_map.get(symbol) if avg_prices_map is not None else None,
+    )
     avg_pe = calculate_avg_pe(avg_prices, eps_by_year)
 
-    # Build annual rows (oldest first) with YoY growth
+    # Build the annual values as a (years x metrics) matrix, oldest first;
+    # YoY growth is then one vectorized pass instead of a per-year,
+    # per-metric Python loop.
+    metric_dicts = [
+        roic_by_year, bvps_by_year, eps_by_year, rev_by_year,
+        fcf_by_year, avg_prices, avg_pe,
+    ]
+    M = np.full((len(all_years), len(ANNUAL_RAW_KEYS)), np.nan)
+    for j, by_year in enumerate(metric_dicts):
+        for i, yr in enumerate(all_years):
+            if yr in by_year:
+                M[i, j] = by_year[yr]
+
+    prior = M[:-1]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        yoy = np.where(prior != 0, (M[1:] - prior) / np.abs(prior), np.nan)
+
     annual_rows = []
-    prev = {}
-    for yr in all_years:
-        row = {
-            "fiscal_year": yr,
-            "roic_pct": roic_by_year.get(yr),
-            "book_value_per_share": bvps_by_year.get(yr),
-            "earnings_per_share": eps_by_year.get(yr),
-            "revenue_mil": rev_by_year.get(yr),
-            "fcf_mil": fcf_by_year.get(yr),
-            "avg_share_price": avg_prices.get(yr),
-            "avg_pe": avg_pe.get(yr),
-        }
-
-        # YoY growth for each metric
-        yoy_pairs = [
-            ("roic_pct", "roic_yoy"),
-            ("book_value_per_share", "bvps_yoy"),
-            ("earnings_per_share", "eps_yoy"),
-            ("revenue_mil", "revenue_yoy"),
-            ("fcf_mil", "fcf_yoy"),
-            ("avg_share_price", "price_yoy"),
-            ("avg_pe", "pe_yoy"),
-        ]
-        for raw_key, yoy_key in yoy_pairs:
-            row[yoy_key] = yoy_growth(row[raw_key], prev.get(raw_key))
-
-        prev = {k: row[k] for k, _ in yoy_pairs}
+    for i, yr in enumerate(all_years):
+        row = {"fiscal_year": yr}
+        for j, key in enumerate(ANNUAL_RAW_KEYS):
+            row[key] = float(M[i, j]) if not np.isnan(M[i, j]) else None
+        for j, key in enumerate(ANNUAL_YOY_KEYS):
+            val = yoy[i - 1, j] if i > 0 else np.nan
+            row[key] = float(val) if not np.isnan(val) else None
         annual_rows.append(row)
 
-    # TTM and snapshot
-    ttm = extract_ttm_values(t, info)
+    # TTM and snapshot (statements already read above)
+    ttm = extract_ttm_values(info, fin, bs)
     snapshot = extract_snapshot(t, info, bs)
 
     # CAGRs
@@ -524,27 +672,21 @@ def process_ticker(symbol):
     if years_recent <= 0:
         years_recent = None
 
-    # Build CAGR mappings: (annual_key, ttm_key, cagr_full_key, cagr_recent_key)
-    cagr_map = [
-        ("roic_pct", "roic_ttm", "roic_cagr_full", "roic_cagr_recent"),
-        ("book_value_per_share", "bvps_ttm", "bvps_cagr_full", "bvps_cagr_recent"),
-        ("earnings_per_share", "eps_ttm", "eps_cagr_full", "eps_cagr_recent"),
-        ("revenue_mil", "revenue_ttm_mil", "revenue_cagr_full", "revenue_cagr_recent"),
-        ("fcf_mil", "fcf_ttm_mil", "fcf_cagr_full", "fcf_cagr_recent"),
-        ("avg_share_price", "price_current", "price_cagr_full", "price_cagr_recent"),
-        ("avg_pe", "pe_ttm", "pe_cagr_full", "pe_cagr_recent"),
-    ]
-
     summary = {
         "years_of_data": len(all_years),
     }
-    for annual_key, ttm_key, full_key, recent_key in cagr_map:
-        summary[full_key] = calculate_cagr(
-            earliest.get(annual_key), latest.get(annual_key), years_full
-        )
-        summary[recent_key] = calculate_cagr(
-            second_to_last.get(annual_key), ttm.get(ttm_key), years_recent
-        )
+    # Pack the CAGR endpoints as aligned float arrays (None -> NaN) and
+    # apply the formula once per horizon instead of 14 scalar calls.
+    start_full = np.array([earliest.get(k) for k, _, _, _ in CAGR_MAP], dtype=float)
+    end_full = np.array([latest.get(k) for k, _, _, _ in CAGR_MAP], dtype=float)
+    start_recent = np.array([second_to_last.get(k) for k, _, _, _ in CAGR_MAP], dtype=float)
+    end_recent = np.array([ttm.get(tk) for _, tk, _, _ in CAGR_MAP], dtype=float)
+
+    cagr_full = cagr_vector(start_full, end_full, years_full)
+    cagr_recent = cagr_vector(start_recent, end_recent, years_recent)
+    for i, (_, _, full_key, recent_key) in enumerate(CAGR_MAP):
+        summary[full_key] = None if np.isnan(cagr_full[i]) else float(cagr_full[i])
+        summary[recent_key] = None if np.isnan(cagr_recent[i]) else float(cagr_recent[i])
 
     summary.update(ttm)
     summary.update(snapshot)
@@ -555,66 +697,97 @@ def process_ticker(symbol):
 # ---------------------------------------------------------------------------
 # Database operations
 # ---------------------------------------------------------------------------
-def upsert_annual(engine, ticker, annual_rows):
-    """Insert or update annual metrics rows."""
-    cols = [
-        "roic_pct", "book_value_per_share", "earnings_per_share",
-        "revenue_mil", "fcf_mil", "avg_share_price", "avg_pe",
-        "roic_yoy", "bvps_yoy", "eps_yoy", "revenue_yoy",
-        "fcf_yoy", "price_yoy", "pe_yoy",
+ANNUAL_COLS = [
+    "roic_pct", "book_value_per_share", "earnings_per_share",
+    "revenue_mil", "fcf_mil", "avg_share_price", "avg_pe",
+    "roic_yoy", "bvps_yoy", "eps_yoy", "revenue_yoy",
+    "fcf_yoy", "price_yoy", "pe_yoy",
+]
+
+SUMMARY_COLS = [
+    "years_of_data",
+    "roic_cagr_full", "bvps_cagr_full", "eps_cagr_full",
+    "revenue_cagr_full", "fcf_cagr_full", "price_cagr_full", "pe_cagr_full",
+    "roic_cagr_recent", "bvps_cagr_recent", "eps_cagr_recent",
+    "revenue_cagr_recent", "fcf_cagr_recent", "price_cagr_recent", "pe_cagr_recent",
+    "roic_ttm", "bvps_ttm", "eps_ttm", "revenue_ttm_mil",
+    "fcf_ttm_mil", "price_current", "pe_ttm",
+    "roa_pct", "roe_pct", "dividends_ttm", "dividend_yield_pct",
+    "total_liabilities", "debt_to_equity", "current_ratio", "quick_ratio",
+]
+
+BATCH_SIZE = 1000
+
+UPSERT_ANNUAL_SQL = f"""
+    INSERT INTO rule1_annual (ticker, fiscal_year, {", ".join(ANNUAL_COLS)}, updated_at)
+    VALUES %s
+    ON CONFLICT (ticker, fiscal_year) DO UPDATE SET
+        {", ".join(f"{c} = EXCLUDED.{c}" for c in ANNUAL_COLS)}, updated_at = NOW()
+"""
+
+ANNUAL_ROW_TEMPLATE = "(" + ", ".join(["%s"] * (len(ANNUAL_COLS) + 2)) + ", NOW())"
+
+UPSERT_SUMMARY_SQL = f"""
+    INSERT INTO rule1_summary (ticker, calc_date, {", ".join(SUMMARY_COLS)}, updated_at)
+    VALUES %s
+    ON CONFLICT (ticker, calc_date) DO UPDATE SET
+        {", ".join(f"{c} = EXCLUDED.{c}" for c in SUMMARY_COLS)}, updated_at = NOW()
+"""
+
+SUMMARY_ROW_TEMPLATE = "(" + ", ".join(["%s"] * (len(SUMMARY_COLS) + 2)) + ", NOW())"
+
+
+def upsert_annual(cur, results):
+    """Bulk insert/update annual metric rows for all processed tickers."""
+    rows = [
+        tuple([ticker, row["fiscal_year"]] + [row.get(c) for c in ANNUAL_COLS])
+        for ticker, (annual_rows, _) in results.items()
+        for row in annual_rows
     ]
-    col_list = ", ".join(cols)
-    val_list = ", ".join(f":{c}" for c in cols)
-    update_list = ", ".join(f"{c} = EXCLUDED.{c}" for c in cols)
+    if not rows:
+        return
+    execute_values(
+        cur,
+        UPSERT_ANNUAL_SQL,
+        rows,
+        template=ANNUAL_ROW_TEMPLATE,
+        page_size=BATCH_SIZE,
+    )
 
-    with engine.begin() as conn:
-        for row in annual_rows:
-            params = {"ticker": ticker, "fiscal_year": row["fiscal_year"]}
-            for c in cols:
-                params[c] = row.get(c)
-            conn.execute(
-                text(f"""
-                    INSERT INTO rule1_annual (ticker, fiscal_year, {col_list}, updated_at)
-                    VALUES (:ticker, :fiscal_year, {val_list}, NOW())
-                    ON CONFLICT (ticker, fiscal_year) DO UPDATE SET
-                        {update_list}, updated_at = NOW()
-                """),
-                params,
-            )
-
-
-def upsert_summary(engine, ticker, summary):
-    """Insert or update summary metrics for today."""
+
+def upsert_summary(cur, results):
+    """Bulk insert/update today's summary rows for all processed tickers."""
     today = date.today()
-    cols = [
-        "years_of_data",
-        "roic_cagr_full", "bvps_cagr_full", "eps_cagr_full",
-        "revenue_cagr_full", "fcf_cagr_full", "price_cagr_full", "pe_cagr_full",
-        "roic_cagr_recent", "bvps_cagr_recent", "eps_cagr_recent",
-        "revenue_cagr_recent", "fcf_cagr_recent", "price_cagr_recent", "pe_cagr_recent",
-        "roic_ttm", "bvps_ttm", "eps_ttm", "revenue_ttm_mil",
-        "fcf_ttm_mil", "price_current", "pe_ttm",
-        "roa_pct", "roe_pct", "dividends_ttm", "dividend_yield_pct",
-        "total_liabilities", "debt_to_equity", "current_ratio", "quick_ratio",
+    rows = [
+        tuple([ticker, today] + [summary.get(c) for c in SUMMARY_COLS])
+        for ticker, (_, summary) in results.items()
     ]
-    col_list = ", ".join(cols)
-    val_list = ", ".join(f":{c}" for c in cols)
-    update_list = ", ".join(f"{c} = EXCLUDED.{c}" for c in cols)
+    if not rows:
+        return
+    execute_values(
+        cur,
+        UPSERT_SUMMARY_SQL,
+        rows,
+        template=SUMMARY_ROW_TEMPLATE,
+        page_size=BATCH_SIZE,
+    )
 
-    params = {"ticker": ticker, "calc_date": today}
-    for c in cols:
-        params[c] = summary.get(c)
 
-    with engine.begin() as conn:
-        conn.execute(
-            text(f"""
-                INSERT INTO rule1_summary (ticker, calc_date, {col_list}, updated_at)
-                VALUES (:ticker, :calc_date, {val_list}, NOW())
-                ON CONFLICT (ticker, calc_date) DO UPDATE SET
-                    {update_list}, updated_at = NOW()
-            """),
-            params,
-        )
+def store_results(engine, results):
+    """Write annual and summary rows on one connection in one transaction.
+
+    A single checkout/commit/close cycle instead of one per table; both
+    upserts land atomically, so a failure can't leave annual rows stored
+    without their matching summary.
+    """
+    raw = engine.raw_connection()
+    try:
+        with raw.cursor() as cur:
+            upsert_annual(cur, results)
+            upsert_summary(cur, results)
+        raw.commit()
+    finally:
+        raw.close()
 
 
 # ---------------------------------------------------------------------------
@@ -623,61 +796,57 @@ def upsert_summary(engine, ticker, summary):
 def print_rule1_report(engine):
     """Print a summary of Rule #1 metrics for all tickers."""
     today = date.today()
-    df = pd.read_sql(
-        text("""
+    # Read over the raw DBAPI connection: pandas feeds psycopg2's cursor
+    # straight into the frame without SQLAlchemy's per-row result proxy.
+    raw = engine.raw_connection()
+    try:
+        df = pd.read_sql_query(
+            """
             SELECT ticker, years_of_data,
                    bvps_cagr_full, eps_cagr_full, revenue_cagr_full, fcf_cagr_full,
                    roic_ttm, roe_pct, debt_to_equity, current_ratio, quick_ratio
             FROM rule1_summary
-            WHERE calc_date = :today
+            WHERE calc_date = %(today)s
             ORDER BY eps_cagr_full DESC NULLS LAST
-        """),
-        engine,
-        params={"today": today},
-    )
+            """,
+            raw,
+            params={"today": today},
+        )
+    finally:
+        raw.close()
     if df.empty:
         log.info("No Rule #1 summary data for today.")
         return
 
-    # Format percentages
+    # Keep the CAGRs numeric for the pass filter below; the display frame
+    # gets formatted to strings in place.
+    cagr_cols = ["bvps_cagr_full", "eps_cagr_full", "revenue_cagr_full", "fcf_cagr_full"]
+    numeric_cagrs = df[cagr_cols].astype(float)
+
+    # Format columns vectorized: np.char.mod renders the whole array at
+    # once instead of a Python lambda per cell.
     pct_cols = ["bvps_cagr_full", "eps_cagr_full", "revenue_cagr_full", "fcf_cagr_full", "roic_ttm", "roe_pct"]
     for col in pct_cols:
         if col in df.columns:
-            df[col] = df[col].apply(lambda x: f"{x:.1f}%" if pd.notna(x) else "N/A")
+            vals = df[col].to_numpy(dtype=float)
+            df[col] = np.where(np.isnan(vals), "N/A", np.char.mod("%.1f%%", vals))
 
     for col in ["debt_to_equity", "current_ratio", "quick_ratio"]:
         if col in df.columns:
-            df[col] = df[col].apply(lambda x: f"{x:.2f}" if pd.notna(x) else "N/A")
+            vals = df[col].to_numpy(dtype=float)
+            df[col] = np.where(np.isnan(vals), "N/A", np.char.mod("%.2f", vals))
 
     log.info(f"\n{'='*80}")
     log.info("Rule #1 Summary — Phil Town Metrics")
     log.info(f"{'='*80}")
     log.info(f"\n{df.to_string(index=False)}")
 
-    # Count tickers meeting Rule #1 criteria (all CAGRs > 10%)
-    numeric_df = pd.read_sql(
-        text("""
-            SELECT ticker,
-                   bvps_cagr_full, eps_cagr_full, revenue_cagr_full, fcf_cagr_full
-            FROM rule1_summary
-            WHERE calc_date = :today
-        """),
-        engine,
-        params={"today": today},
-    )
-    if not numeric_df.empty:
-        cagr_cols = ["bvps_cagr_full", "eps_cagr_full", "revenue_cagr_full", "fcf_cagr_full"]
-        passing = numeric_df.dropna(subset=cagr_cols)
-        if not passing.empty:
-            rule1_pass = passing[
-                (passing["bvps_cagr_full"] >= 10) &
-                (passing["eps_cagr_full"] >= 10) &
-                (passing["revenue_cagr_full"] >= 10) &
-                (passing["fcf_cagr_full"] >= 10)
-            ]
-            log.info(f"\nRule #1 Pass (all CAGRs >= 10%): {len(rule1_pass)} of {len(numeric_df)} tickers")
-            if not rule1_pass.empty:
-                log.info(f"  Tickers: {', '.join(rule1_pass['ticker'].tolist())}")
+    # Count tickers meeting Rule #1 criteria (all CAGRs > 10%), reusing
+    # the numeric CAGRs kept from the single query (NaN never passes ge)
+    rule1_pass = df["ticker"][numeric_cagrs.ge(10).all(axis=1)]
+    log.info(f"\nRule #1 Pass (all CAGRs >= 10%): {len(rule1_pass)} of {len(df)} tickers")
+    if not rule1_pass.empty:
+        log.info(f"  Tickers: {', '.join(rule1_pass.tolist())}")
 
 
 # ---------------------------------------------------------------------------
@@ -686,41 +855,63 @@ def print_rule1_report(engine):
 def main():
     log.info("Rule #1 Analyzer starting...")
 
-    engine = create_engine(DATABASE_URL)
+    # All DB work happens sequentially on the main thread, so one pooled
+    # connection is plenty for this batch job.
+    engine = create_engine(DATABASE_URL, pool_size=1)
     create_tables(engine)
 
     tickers = get_tickers()
-    log.info(f"Processing {len(tickers)} tickers...")
+    log.info(f"Processing {len(tickers)} tickers with {FETCH_THREADS} threads...")
+
+    # -- Fetch phase: threaded, rate-limited; no DB writes in workers --
+    # Cached session (when requests_cache is installed): re-runs serve
+    # info/statements/history from disk instead of re-downloading.
+    session = None
+    if requests_cache is not None:
+        session = requests_cache.CachedSession(YF_CACHE, expire_after=YF_CACHE_TTL)
+        log.info(f"HTTP cache enabled: {YF_CACHE} (TTL {YF_CACHE_TTL}s)")
+
+    # Price history for every ticker in one batched download
+    avg_prices_by_ticker = download_avg_prices(tickers, session=session)
 
-    success = 0
+    limiter = RateLimiter(DELAY)
+
+    def fetch_one(symbol):
+        limiter.wait()
+        return process_ticker(symbol, session=session, avg_prices_map=avg_prices_by_ticker)
+
+    results = {}
     errors = 0
 
-    for i, symbol in enumerate(tickers, 1):
-        try:
-            log.info(f"[{i}/{len(tickers)}] {symbol}")
-            annual_rows, summary = process_ticker(symbol)
+    with ThreadPoolExecutor(max_workers=FETCH_THREADS) as pool:
+        futures = {pool.submit(fetch_one, s): s for s in tickers}
+        for i, future in enumerate(as_completed(futures), 1):
+            symbol = futures[future]
+            try:
+                annual_rows, summary = future.result()
+            except Exception as e:
+                log.error(f"[{i}/{len(tickers)}] {symbol}: {e}")
+                errors += 1
+                continue
 
             if annual_rows is not None:
-                upsert_annual(engine, symbol, annual_rows)
-                upsert_summary(engine, symbol, summary)
+                results[symbol] = (annual_rows, summary)
                 yrs = len(annual_rows)
                 bvps_cagr = summary.get("bvps_cagr_full")
                 eps_cagr = summary.get("eps_cagr_full")
                 bvps_str = f"{bvps_cagr:.1%}" if bvps_cagr is not None else "N/A"
                 eps_str = f"{eps_cagr:.1%}" if eps_cagr is not None else "N/A"
-                log.info(f"  -> {yrs} years, BVPS CAGR: {bvps_str}, EPS CAGR: {eps_str}")
-                success += 1
+                log.info(
+                    f"[{i}/{len(tickers)}] {symbol} -> {yrs} years, "
+                    f"BVPS CAGR: {bvps_str}, EPS CAGR: {eps_str}"
+                )
             else:
                 errors += 1
 
-            if i < len(tickers):
-                time.sleep(DELAY)
-
-        except Exception as e:
-            log.error(f"  Error: {e}")
-            errors += 1
+    # -- Store phase: batched DB writes on the main thread --
+    store_results(engine, results)
 
-    log.info(f"\nFetch complete: {success} ok, {errors} failed")
+    log.info(f"\nFetch complete: {len(results)} ok, {errors} failed")
 
     log.info("Generating Rule #1 report...")
     print_rule1_report(engine)